@@ -1,12 +1,15 @@
 // Global variables
 let isResearching = false;
 let currentReport = '';
+let currentReportId = '';
+let currentReportHtml = '';
 
 // DOM elements - Fixed to match actual HTML IDs
 const researchTopicInput = document.getElementById('research-topic');
 const researchButton = document.getElementById('research-btn');
 const reportContainer = document.getElementById('results-section');
 const downloadButton = document.getElementById('download-btn');
+const exportFormatSelect = document.getElementById('export-format');
 const statusContainer = document.getElementById('status-section');
 const statusTitle = document.getElementById('status-title');
 const statusDescription = document.getElementById('status-description');
@@ -82,9 +85,14 @@ async function startResearch() {
 
         const data = await response.json();
 
-        if (data.status === 'success') {
+        if (data.status === 'success' || data.status === 'partial') {
             currentReport = data.report;
+            currentReportId = data.report_id || '';
+            currentReportHtml = data.html || '';
             updateUIState('success');
+            if (data.partial) {
+                showToast('Time ran out, so this report is partial', 'warning');
+            }
         } else if (data.status === 'queued') {
             await pollQueueStatus(data.session_id, data.queue_position);
         }
@@ -114,6 +122,8 @@ async function pollQueueStatus(sessionId, initialQueuePosition) {
 
             if (status.status === 'completed') {
                 currentReport = status.result;
+                currentReportId = status.report_id || '';
+                currentReportHtml = status.html || '';
                 updateUIState('success');
                 return;
             } else if (status.status === 'failed') {
@@ -203,7 +213,7 @@ function updateUIState(state, message = '') {
             showElement(downloadButton);
             hideElement(statusContainer);
             hideElement(document.getElementById('error-section'));
-            displayReport(currentReport);
+            displayReport(currentReportHtml);
             break;
             
         case 'error':
@@ -237,107 +247,14 @@ function updateUIState(state, message = '') {
     }
 }
 
-function displayReport(report) {
+function displayReport(html) {
     const reportContent = document.getElementById('report-content');
-    const formattedReport = formatReport(report);
-    reportContent.innerHTML = formattedReport;
-}
-
-function formatReport(report) {
-    if (!report) return '';
-    
-    // Clean up the report by removing markdown symbols
-    let cleanReport = report.replace(/#+/g, '');
-    
-    // Ensure main sections are on their own lines
-    const mainSections = ['Executive Summary', 'Introduction', 'Key Findings', 'Conclusion', 'Thesis'];
-    mainSections.forEach(section => {
-        // Replace inline section headers with proper line breaks
-        cleanReport = cleanReport.replace(new RegExp(`(?<!\\n)${section}(?!\\n)`, 'g'), `\n\n${section}\n\n`);
-    });
-    
-    // Split by double line breaks to get sections
-    const sections = cleanReport.split(/\n\s*\n/);
-    
-    let sectionCounter = 1;
-    
-    return sections.map(section => {
-        const trimmedSection = section.trim();
-        if (!trimmedSection) return '';
-        
-        // Check if it's a main section header (exact match)
-        if (mainSections.includes(trimmedSection)) {
-            const numberedHeader = `${sectionCounter}. ${trimmedSection}`;
-            sectionCounter++;
-            return `<h1>${numberedHeader}</h1>`;
-        }
-        
-        // Check if it starts with a main section header followed by content
-        for (const header of mainSections) {
-            if (trimmedSection.startsWith(header)) {
-                const remainingText = trimmedSection.substring(header.length).trim();
-                const numberedHeader = `${sectionCounter}. ${header}`;
-                sectionCounter++;
-                
-                if (remainingText) {
-                    // Split the header from the content and handle multiple paragraphs
-                    const contentParagraphs = remainingText.split(/\n\s*\n/);
-                    const formattedContent = contentParagraphs.map(para => {
-                        if (para.trim()) {
-                            return `<p>${formatMarkdownText(para.trim())}</p>`;
-                        }
-                        return '';
-                    }).join('');
-                    return `<h1>${numberedHeader}</h1>${formattedContent}`;
-                } else {
-                    return `<h1>${numberedHeader}</h1>`;
-                }
-            }
-        }
-        
-        // Regular paragraph content
-        return `<p>${formatMarkdownText(trimmedSection)}</p>`;
-    }).join('');
-}
-
-function formatMarkdownText(text) {
-    if (!text) return '';
-    
-    // Convert bold text
-    text = text.replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
-    
-    // Convert italic text
-    text = text.replace(/\*(.*?)\*/g, '<em>$1</em>');
-    
-    // Convert bullet points
-    const lines = text.split('\n');
-    const formattedLines = [];
-    let inList = false;
-    
-    for (const line of lines) {
-        const stripped = line.trim();
-        if (stripped.startsWith('- ')) {
-            if (!inList) {
-                formattedLines.push('<ul>');
-                inList = true;
-            }
-            formattedLines.push(`<li>${stripped.substring(2)}</li>`);
-        } else {
-            if (inList) {
-                formattedLines.push('</ul>');
-                inList = false;
-            }
-            if (stripped) {
-                formattedLines.push(`<p>${stripped}</p>`);
-            }
-        }
-    }
-    
-    if (inList) {
-        formattedLines.push('</ul>');
+    // The server parses the report once and returns ready-to-insert HTML
+    if (html) {
+        reportContent.innerHTML = html;
+    } else {
+        reportContent.textContent = currentReport;
     }
-    
-    return formattedLines.join('');
 }
 
 function downloadReport() {
@@ -347,39 +264,46 @@ function downloadReport() {
     }
 
     const topic = document.getElementById('research-topic').value.trim() || 'Research Report';
-    generatePdfOnServer(topic, currentReport);
+    const format = exportFormatSelect ? exportFormatSelect.value : 'pdf';
+    exportReportOnServer(topic, currentReport, format);
 }
 
-async function generatePdfOnServer(topic, report) {
+const EXPORT_EXTENSIONS = { pdf: 'pdf', html: 'html', markdown: 'md', docx: 'docx' };
+
+async function exportReportOnServer(topic, report, format) {
+    const label = format.toUpperCase();
     try {
-        showToast('Generating PDF...', 'success');
-        const response = await fetch('/api/download-pdf', {
+        showToast(`Generating ${label}...`, 'success');
+        const response = await fetch(`/api/export/${format}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
             },
-            body: JSON.stringify({ topic, report }),
+            // The report id lets the server reuse its cached tree and renders;
+            // the text is a fallback in case the cache entry was evicted.
+            body: JSON.stringify({ topic, report, report_id: currentReportId }),
         });
 
         if (!response.ok) {
             const errorData = await response.json().catch(() => ({}));
-            throw new Error(errorData.detail || 'Failed to generate PDF');
+            throw new Error(errorData.detail || `Failed to generate ${label}`);
         }
 
         const blob = await response.blob();
         const url = URL.createObjectURL(blob);
         const link = document.createElement('a');
         link.href = url;
-        const filename = `${topic.replace(/[^a-z0-9]/gi, '_').toLowerCase() || 'research_report'}.pdf`;
+        const extension = EXPORT_EXTENSIONS[format] || format;
+        const filename = `${topic.replace(/[^a-z0-9]/gi, '_').toLowerCase() || 'research_report'}.${extension}`;
         link.download = filename;
         document.body.appendChild(link);
         link.click();
         document.body.removeChild(link);
         URL.revokeObjectURL(url);
-        showToast('PDF downloaded successfully!', 'success');
+        showToast(`${label} downloaded successfully!`, 'success');
     } catch (error) {
-        console.error('Server PDF generation error:', error);
-        showToast(error.message || 'Failed to generate PDF.', 'error');
+        console.error('Server export error:', error);
+        showToast(error.message || `Failed to generate ${label}.`, 'error');
     }
 }
 
@@ -1,15 +1,24 @@
 import os
 import io
 import re
+import html
+import time
+import datetime
 import asyncio
+import hashlib
+import tempfile
+import threading
 import httpx
 import traceback
+import docx
+from collections import Counter, OrderedDict
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from typing import List, Dict, Any
+from typing import List, Dict, Any, IO, Iterator, Optional, Tuple
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_JUSTIFY
@@ -23,9 +32,47 @@ load_dotenv()
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 OPENROUTER_MODEL = os.getenv("OPENROUTER_MODEL", "openrouter/hunter-alpha")
+REPORT_CACHE_SIZE = int(os.getenv("REPORT_CACHE_SIZE", 64))
+# Rendered exports above this size are not kept in the report cache; kept
+# below PDF_SPOOL_THRESHOLD so large PDFs stream from disk, uncached
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 256 * 1024))
+# Total size of all cached renders; least recently used renders go first
+RENDER_CACHE_TOTAL_BYTES = int(os.getenv("RENDER_CACHE_TOTAL_BYTES", 32 * 1024 * 1024))
+# PDFs above this size are spooled to a temp file instead of held in memory
+PDF_SPOOL_THRESHOLD = int(os.getenv("PDF_SPOOL_THRESHOLD", 1024 * 1024))
+MAX_CONCURRENT_PDF_RENDERS = int(os.getenv("MAX_CONCURRENT_PDF_RENDERS", 2))
+PDF_CHUNK_SIZE = 64 * 1024
+RESEARCH_DEADLINE_SECONDS = float(os.getenv("RESEARCH_DEADLINE_SECONDS", 90))
+
+# Upper bounds for each pipeline stage; the request deadline may shrink them
+PLAN_TIMEOUT = 30
+SEARCH_TIMEOUT = 30
+REPORT_TIMEOUT = 60
+
+# Off-peak prefetching of trending topics
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+PREFETCH_OFFPEAK_HOURS = os.getenv("PREFETCH_OFFPEAK_HOURS", "1-6")
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", 20))
+PREFETCH_MIN_REQUESTS = int(os.getenv("PREFETCH_MIN_REQUESTS", 2))
+PREFETCH_DAILY_RUNS = int(os.getenv("PREFETCH_DAILY_RUNS", 40))
+PREFETCH_INTERVAL_SECONDS = float(os.getenv("PREFETCH_INTERVAL_SECONDS", 600))
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", 24 * 3600))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the trending-topic prefetcher for the lifetime of the app."""
+    if PREFETCH_ENABLED and openrouter_client and tavily_client:
+        prefetch_scheduler.start()
+    yield
+    await prefetch_scheduler.stop()
+
 
 # Initialize FastAPI app
-app = FastAPI(title="Research Hub", description="AI-powered research report generator")
+app = FastAPI(
+    title="Research Hub",
+    description="AI-powered research report generator",
+    lifespan=lifespan,
+)
 
 # Add CORS middleware
 app.add_middleware(
@@ -45,18 +92,55 @@ async def serve_static(file_path: str):
 # Pydantic models
 class ResearchRequest(BaseModel):
     topic: str
+    deadline_seconds: Optional[float] = None
 
 class ResearchResponse(BaseModel):
     report: str
     status: str
     session_id: str = ""
     queue_position: int = 0
+    report_id: str = ""
+    html: str = ""
+    partial: bool = False
 
 
 class PDFRequest(BaseModel):
     topic: str
     report: str
 
+
+class ExportRequest(BaseModel):
+    topic: str = ""
+    report: str = ""
+    report_id: str = ""
+
+
+class ReportBlock(BaseModel):
+    kind: str  # "paragraph" or "bullets"
+    text: str = ""
+    items: List[str] = []
+
+
+class ReportSection(BaseModel):
+    heading: Optional[str] = None
+    blocks: List[ReportBlock] = []
+
+
+class ReportDocument(BaseModel):
+    report_id: str
+    topic: str
+    sections: List[ReportSection] = []
+
+def stage_timeout(budget: float) -> httpx.Timeout:
+    """Split a stage budget so connecting plus reading never exceeds it.
+
+    httpx applies a bare float to every phase separately, so a stage could
+    otherwise run for several times its budget.
+    """
+    connect = min(5.0, budget / 4)
+    return httpx.Timeout(budget - connect, connect=connect, pool=connect)
+
+
 class OpenRouterClient:
     def __init__(self, api_key: str):
         self.api_key = api_key
@@ -68,7 +152,7 @@ class OpenRouterClient:
             "X-Title": "Research Hub"
         }
     
-    def generate_research_plan(self, topic: str) -> str:
+    def generate_research_plan(self, topic: str, timeout: float = PLAN_TIMEOUT) -> str:
         """Generate a research plan for the given topic"""
         prompt = f"""
         Create a comprehensive research plan for the topic: "{topic}"
@@ -93,7 +177,7 @@ class OpenRouterClient:
             f"{self.base_url}/chat/completions",
             headers=self.headers,
             json=payload,
-            timeout=30
+            timeout=stage_timeout(timeout)
         )
 
         if response.status_code != 200:
@@ -103,7 +187,13 @@ class OpenRouterClient:
 
         return response.json()["choices"][0]["message"]["content"]
 
-    def generate_report(self, topic: str, research_data: str) -> str:
+    def generate_report(
+        self,
+        topic: str,
+        research_data: str,
+        timeout: float = REPORT_TIMEOUT,
+        max_tokens: int = 2000,
+    ) -> str:
         """Generate a comprehensive research report"""
         prompt = f"""
         Based on the research data provided, create a comprehensive research report on the topic: "{topic}"
@@ -132,7 +222,7 @@ class OpenRouterClient:
         payload = {
             "model": OPENROUTER_MODEL,
             "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 2000,
+            "max_tokens": max_tokens,
             "temperature": 0.7
         }
 
@@ -140,7 +230,7 @@ class OpenRouterClient:
             f"{self.base_url}/chat/completions",
             headers=self.headers,
             json=payload,
-            timeout=60
+            timeout=stage_timeout(timeout)
         )
 
         if response.status_code != 200:
@@ -155,7 +245,7 @@ class TavilyClient:
         self.api_key = api_key
         self.base_url = "https://api.tavily.com"
 
-    def search(self, query: str, max_results: int = 5) -> str:
+    def search(self, query: str, max_results: int = 5, timeout: float = SEARCH_TIMEOUT) -> str:
         """Search for information using Tavily API"""
         try:
             response = httpx.post(
@@ -171,7 +261,7 @@ class TavilyClient:
                     "include_domains": [],
                     "exclude_domains": []
                 },
-                timeout=30
+                timeout=stage_timeout(timeout)
             )
             
             if response.status_code != 200:
@@ -194,6 +284,8 @@ class TavilyClient:
             
             return "\n".join(results) if results else "No search results found."
             
+        except httpx.TimeoutException:
+            raise
         except Exception as e:
             raise Exception(f"Tavily search failed: {str(e)}")
 
@@ -219,57 +311,233 @@ research_semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
 MAIN_SECTIONS = ["Executive Summary", "Introduction", "Key Findings", "Conclusion", "Thesis"]
 
 
-def parse_report_sections(report: str):
-    if not report:
-        return []
+# Optional emphasis around a heading's number or name: *, ** or __
+_HEADING_EMPHASIS = r'(?:\*{1,2}|__)?'
 
-    clean = report.replace('\r', '')
-    clean = clean.replace('#', '')
+# A section heading must start its line. It may carry "#" markers, a "1."
+# number and emphasis on either side of the number or name, then ends with
+# "#", ".", ":" or "-" punctuation, or a ":"/" - " followed by the section's
+# first text.
+SECTION_HEADING_PATTERN = re.compile(
+    r'^\s*(?:#+\s*)?' + _HEADING_EMPHASIS + r'(?:\d+\.\s*)?' + _HEADING_EMPHASIS
+    + r'(' + '|'.join(MAIN_SECTIONS) + r')' + _HEADING_EMPHASIS
+    + r'(?:\s*(?::|\s-)' + _HEADING_EMPHASIS + r'\s*(.*?)'
+    + r'|[\s#.:-]*' + _HEADING_EMPHASIS + r')\s*$'
+)
 
-    for section in MAIN_SECTIONS:
-        pattern = rf'(?<!\n){section}(?!\n)'
-        clean = re.sub(pattern, f"\n\n{section}\n\n", clean)
 
-    blocks = [block.strip() for block in re.split(r'\n\s*\n', clean) if block.strip()]
+def parse_report_sections(report: str):
+    if not report:
+        return []
 
     sections = []
     current_heading = None
     current_paragraphs: List[str] = []
-
-    for block in blocks:
-        normalized = re.sub(r'^\d+\.\s*', '', block).strip(' :.-')
-        if normalized in MAIN_SECTIONS:
-            if current_heading:
+    current_lines: List[str] = []
+
+    def flush_paragraph() -> None:
+        if current_lines:
+            current_paragraphs.append("\n".join(current_lines))
+            current_lines.clear()
+
+    for line in report.replace('\r', '').split('\n'):
+        match = SECTION_HEADING_PATTERN.match(line)
+        if match:
+            flush_paragraph()
+            if current_heading or current_paragraphs:
                 sections.append((current_heading, current_paragraphs))
-            current_heading = normalized
+            current_heading = match.group(1)
             current_paragraphs = []
+            if match.group(2):
+                current_lines.append(match.group(2))
             continue
 
-        matches = [sec for sec in MAIN_SECTIONS if normalized.startswith(sec)]
-        if matches:
-            if current_heading:
-                sections.append((current_heading, current_paragraphs))
-            current_heading = matches[0]
-            remainder = normalized[len(matches[0]):].strip(' :.-')
-            current_paragraphs = [remainder] if remainder else []
-            continue
-
-        current_paragraphs.append(block)
+        text = re.sub(r'^\s*#+\s*', '', line).strip()
+        if text:
+            current_lines.append(text)
+        else:
+            flush_paragraph()
 
-    if current_heading:
+    flush_paragraph()
+    if current_heading or current_paragraphs:
         sections.append((current_heading, current_paragraphs))
 
     return sections
 
 
-def generate_pdf_bytes(topic: str, report: str) -> io.BytesIO:
+def split_paragraph_blocks(paragraph: str) -> List[ReportBlock]:
+    """Split a paragraph into runs of body text and "- " bullet lists."""
+    blocks: List[ReportBlock] = []
+    lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
+
+    for line in lines:
+        is_bullet = line.startswith('- ')
+        previous = blocks[-1] if blocks else None
+        if is_bullet:
+            if previous and previous.kind == "bullets":
+                previous.items.append(line[2:])
+            else:
+                blocks.append(ReportBlock(kind="bullets", items=[line[2:]]))
+        elif previous and previous.kind == "paragraph":
+            previous.text = f"{previous.text}\n{line}"
+        else:
+            blocks.append(ReportBlock(kind="paragraph", text=line))
+
+    return blocks
+
+
+def compute_report_id(topic: str, report: str) -> str:
+    digest = hashlib.sha256(f"{topic}\0{report}".encode("utf-8")).hexdigest()
+    return digest[:16]
+
+
+def build_report_document(topic: str, report: str) -> ReportDocument:
+    """Parse raw report text into the section/paragraph/bullet tree."""
     cleaned_topic = (topic or "Research Report").strip()
     if not report or not report.strip():
         raise ValueError("Report content is empty.")
 
-    buffer = io.BytesIO()
+    sections = []
+    for heading, paragraphs in parse_report_sections(report):
+        blocks: List[ReportBlock] = []
+        for paragraph in paragraphs:
+            blocks.extend(split_paragraph_blocks(paragraph))
+        sections.append(ReportSection(heading=heading, blocks=blocks))
+
+    return ReportDocument(
+        report_id=compute_report_id(cleaned_topic, report),
+        topic=cleaned_topic,
+        sections=sections,
+    )
+
+
+INLINE_PATTERN = re.compile(r'\*\*(.+?)\*\*|\*(.+?)\*')
+
+
+def iter_inline_runs(text: str):
+    """Yield (text, style) pairs for **bold** and *italic* markup."""
+    position = 0
+    for match in INLINE_PATTERN.finditer(text):
+        if match.start() > position:
+            yield text[position:match.start()], ""
+        if match.group(1) is not None:
+            yield match.group(1), "bold"
+        else:
+            yield match.group(2), "italic"
+        position = match.end()
+    if position < len(text):
+        yield text[position:], ""
+
+
+def format_inline_markup(text: str, bold_tag: str = "strong", italic_tag: str = "em") -> str:
+    parts = []
+    for segment, style in iter_inline_runs(text):
+        escaped = html.escape(segment, quote=False)
+        if style == "bold":
+            parts.append(f"<{bold_tag}>{escaped}</{bold_tag}>")
+        elif style == "italic":
+            parts.append(f"<{italic_tag}>{escaped}</{italic_tag}>")
+        else:
+            parts.append(escaped)
+    return "".join(parts)
+
+
+def iter_numbered_sections(document: ReportDocument):
+    """Yield (label, section) with main sections numbered in order."""
+    counter = 0
+    for section in document.sections:
+        if section.heading:
+            counter += 1
+            yield f"{counter}. {section.heading}", section
+        else:
+            yield None, section
+
+
+class ReportCache:
+    """Thread-safe LRU of parsed report documents and their rendered outputs.
+
+    Documents are capped by count. Renders are also capped by their total
+    size, evicting the least recently used render first.
+    """
+
+    def __init__(self, max_entries: int, max_render_bytes: int):
+        self.max_entries = max_entries
+        self.max_render_bytes = max_render_bytes
+        self.render_bytes = 0
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._render_order: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_document(self, report_id: str) -> Optional[ReportDocument]:
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(report_id)
+            return entry["document"]
+
+    def put_document(self, document: ReportDocument) -> None:
+        with self._lock:
+            if document.report_id in self._entries:
+                self._entries.move_to_end(document.report_id)
+                return
+            self._entries[document.report_id] = {"document": document, "renders": {}}
+            while len(self._entries) > self.max_entries:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                for fmt in list(evicted["renders"]):
+                    self._drop_render(evicted_id, fmt, evicted)
+
+    def get_render(self, report_id: str, fmt: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(report_id)
+            content = entry["renders"].get(fmt) if entry else None
+            if content is not None:
+                self._render_order.move_to_end((report_id, fmt))
+            return content
+
+    def put_render(self, report_id: str, fmt: str, content: bytes) -> None:
+        with self._lock:
+            entry = self._entries.get(report_id)
+            if entry is None or len(content) > self.max_render_bytes:
+                return
+            if fmt in entry["renders"]:
+                self._drop_render(report_id, fmt, entry)
+            entry["renders"][fmt] = content
+            self._render_order[(report_id, fmt)] = len(content)
+            self.render_bytes += len(content)
+            while self.render_bytes > self.max_render_bytes:
+                oldest_id, oldest_fmt = next(iter(self._render_order))
+                self._drop_render(oldest_id, oldest_fmt, self._entries[oldest_id])
+
+    def _drop_render(self, report_id: str, fmt: str, entry: Dict[str, Any]) -> None:
+        del entry["renders"][fmt]
+        self.render_bytes -= self._render_order.pop((report_id, fmt))
+
+
+report_cache = ReportCache(REPORT_CACHE_SIZE, max_render_bytes=RENDER_CACHE_TOTAL_BYTES)
+
+
+def get_report_document(topic: str, report: str) -> ReportDocument:
+    """Return the parsed tree for a report, parsing it at most once."""
+    cleaned_topic = (topic or "Research Report").strip()
+    cached = report_cache.get_document(compute_report_id(cleaned_topic, report or ""))
+    if cached is not None:
+        return cached
+
+    document = build_report_document(cleaned_topic, report)
+    report_cache.put_document(document)
+    return document
+
+
+# ReportLab keeps the whole document in memory while building, so cap how
+# many renders run at once in this process. Waiters queue on the event loop
+# rather than holding a worker thread.
+pdf_render_slots = asyncio.Semaphore(MAX_CONCURRENT_PDF_RENDERS)
+
+
+def write_pdf(document: ReportDocument, output: IO[bytes]) -> None:
     doc = SimpleDocTemplate(
-        buffer,
+        output,
         pagesize=letter,
         leftMargin=0.75 * inch,
         rightMargin=0.75 * inch,
@@ -314,38 +582,232 @@ def generate_pdf_bytes(topic: str, report: str) -> io.BytesIO:
     )
 
     story = []
-    story.append(Paragraph(cleaned_topic, title_style))
+    story.append(Paragraph(html.escape(document.topic, quote=False), title_style))
     story.append(Spacer(1, 12))
 
-    sections = parse_report_sections(report)
-
-    if not sections:
-        story.append(Paragraph(report.replace('\n', '<br/>'), body_style))
-    else:
-        for index, (heading, paragraphs) in enumerate(sections, start=1):
-            story.append(Paragraph(f"{index}. {heading}", heading_style))
+    for label, section in iter_numbered_sections(document):
+        if label:
+            story.append(Paragraph(html.escape(label, quote=False), heading_style))
             story.append(Spacer(1, 6))
 
-            if not paragraphs:
-                continue
+        if not section.blocks:
+            continue
 
-            for paragraph in paragraphs:
-                lines = [line.strip() for line in paragraph.splitlines() if line.strip()]
-                if lines and all(line.startswith('- ') for line in lines):
-                    for line in lines:
-                        story.append(Paragraph(line[2:], bullet_style, bulletText='•'))
-                else:
-                    story.append(Paragraph(paragraph.replace('\n', '<br/>'), body_style))
+        for block in section.blocks:
+            if block.kind == "bullets":
+                for item in block.items:
+                    story.append(Paragraph(format_inline_markup(item, "b", "i"), bullet_style, bulletText='•'))
+            else:
+                markup = format_inline_markup(block.text, "b", "i").replace('\n', '<br/>')
+                story.append(Paragraph(markup, body_style))
 
-            story.append(Spacer(1, 12))
+        story.append(Spacer(1, 12))
 
     doc.build(story)
-    buffer.seek(0)
-    return buffer
 
 
-def perform_research(topic: str) -> str:
-    """Run the research pipeline synchronously away from the event loop."""
+def render_html_fragment(document: ReportDocument, heading_tag: str = "h1") -> str:
+    parts = []
+    for label, section in iter_numbered_sections(document):
+        if label:
+            parts.append(f"<{heading_tag}>{html.escape(label, quote=False)}</{heading_tag}>")
+        for block in section.blocks:
+            if block.kind == "bullets":
+                items = "".join(f"<li>{format_inline_markup(item)}</li>" for item in block.items)
+                parts.append(f"<ul>{items}</ul>")
+            else:
+                text = format_inline_markup(block.text).replace('\n', '<br/>')
+                parts.append(f"<p>{text}</p>")
+    return "".join(parts)
+
+
+def render_web_html(document: ReportDocument) -> bytes:
+    return render_html_fragment(document).encode("utf-8")
+
+
+def render_html(document: ReportDocument) -> bytes:
+    title = html.escape(document.topic, quote=False)
+    page = (
+        "<!DOCTYPE html>\n"
+        '<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+        f"<title>{title}</title>\n</head>\n<body>\n"
+        f"<h1>{title}</h1>\n"
+        f"{render_html_fragment(document, heading_tag='h2')}\n"
+        "</body>\n</html>\n"
+    )
+    return page.encode("utf-8")
+
+
+def render_markdown(document: ReportDocument) -> bytes:
+    lines = [f"# {document.topic}", ""]
+    for label, section in iter_numbered_sections(document):
+        if label:
+            lines.extend([f"## {label}", ""])
+        for block in section.blocks:
+            if block.kind == "bullets":
+                lines.extend(f"- {item}" for item in block.items)
+            else:
+                lines.extend(block.text.splitlines())
+            lines.append("")
+    return "\n".join(lines).encode("utf-8")
+
+
+def render_docx(document: ReportDocument) -> bytes:
+    output = docx.Document()
+    output.add_heading(document.topic, level=0)
+
+    def add_runs(paragraph, text: str) -> None:
+        for segment, style in iter_inline_runs(text):
+            run = paragraph.add_run(segment)
+            run.bold = style == "bold"
+            run.italic = style == "italic"
+
+    for label, section in iter_numbered_sections(document):
+        if label:
+            output.add_heading(label, level=1)
+        for block in section.blocks:
+            if block.kind == "bullets":
+                for item in block.items:
+                    add_runs(output.add_paragraph(style="List Bullet"), item)
+            else:
+                add_runs(output.add_paragraph(), block.text.replace('\n', ' '))
+
+    buffer = io.BytesIO()
+    output.save(buffer)
+    return buffer.getvalue()
+
+
+# format -> (media type, file extension) for /api/export
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "pdf": ("application/pdf", "pdf"),
+    "html": ("text/html", "html"),
+    "markdown": ("text/markdown", "md"),
+    "docx": ("application/vnd.openxmlformats-officedocument.wordprocessingml.document", "docx"),
+}
+
+# In-memory renderers; "web" is the in-page view. PDFs only go through
+# open_pdf_stream so they are never built into a whole in-memory buffer.
+REPORT_RENDERERS: Dict[str, Any] = {
+    "html": render_html,
+    "markdown": render_markdown,
+    "docx": render_docx,
+    "web": render_web_html,
+}
+
+
+def render_report(document: ReportDocument, fmt: str) -> bytes:
+    """Render a parsed report in the given format, reusing cached output."""
+    if fmt not in REPORT_RENDERERS:
+        raise ValueError(f"Unsupported render format: {fmt}")
+
+    cached = report_cache.get_render(document.report_id, fmt)
+    if cached is not None:
+        return cached
+
+    renderer = REPORT_RENDERERS[fmt]
+    content = renderer(document)
+    if len(content) <= RENDER_CACHE_MAX_BYTES:
+        report_cache.put_render(document.report_id, fmt, content)
+    return content
+
+
+def open_pdf_stream(document: ReportDocument) -> IO[bytes]:
+    """Render a PDF into a spooled temp file that moves to disk once it is large."""
+    cached = report_cache.get_render(document.report_id, "pdf")
+    if cached is not None:
+        return io.BytesIO(cached)
+
+    spool = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_THRESHOLD)
+    try:
+        write_pdf(document, spool)
+        size = spool.tell()
+        spool.seek(0)
+        if size <= RENDER_CACHE_MAX_BYTES:
+            # Stream from the cached copy so the PDF is not held twice
+            content = spool.read()
+            spool.close()
+            report_cache.put_render(document.report_id, "pdf", content)
+            return io.BytesIO(content)
+    except Exception:
+        spool.close()
+        raise
+    return spool
+
+
+async def render_pdf_stream(document: ReportDocument) -> IO[bytes]:
+    """Open a PDF stream, taking a render slot before using a worker thread."""
+    cached = report_cache.get_render(document.report_id, "pdf")
+    if cached is not None:
+        return io.BytesIO(cached)
+
+    async with pdf_render_slots:
+        return await asyncio.to_thread(open_pdf_stream, document)
+
+
+def iter_file_chunks(stream: IO[bytes], chunk_size: int = PDF_CHUNK_SIZE) -> Iterator[bytes]:
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
+
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a request's deadline runs out before anything useful was produced."""
+
+
+class Deadline:
+    """Wall-clock budget for a single request, shared by every pipeline stage."""
+
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def budget(self, cap: float, reserve: float = 0.0) -> float:
+        """Time a stage may spend: at most `cap`, keeping `reserve` for later stages."""
+        return max(0.0, min(cap, self.remaining() - reserve))
+
+
+# Minimum useful time per stage; below these the stage is skipped
+PLAN_MIN_SECONDS = 10
+SEARCH_MIN_SECONDS = 5
+REPORT_MIN_SECONDS = 10
+
+# (report budget in seconds, max_tokens) — shorter budgets ask for shorter reports
+REPORT_TOKEN_BUDGETS = [(45, 2000), (25, 1200), (0, 600)]
+
+
+class ResearchResult(BaseModel):
+    report: str
+    partial: bool = False
+
+
+def build_partial_report(topic: str, research_data: str) -> str:
+    """Fallback report from raw search results when the model ran out of time."""
+    return (
+        "Executive Summary\n\n"
+        f"The full report on \"{topic}\" could not be generated within the time budget. "
+        "The sources gathered so far are listed below.\n\n"
+        "Key Findings\n\n"
+        f"{research_data.strip()}"
+    )
+
+
+def perform_research(
+    topic: str,
+    deadline: Optional[Deadline] = None,
+    progress: Optional[Dict[str, str]] = None,
+) -> ResearchResult:
+    """Run the research pipeline synchronously away from the event loop.
+
+    Gathered sources are stored in ``progress`` so a caller that stops
+    waiting at the deadline can still return a partial report.
+    """
     cleaned_topic = (topic or "").strip()
     if not cleaned_topic:
         raise ValueError("Research topic cannot be empty")
@@ -356,54 +818,359 @@ def perform_research(topic: str) -> str:
     if not tavily_client:
         raise ValueError("Tavily API key not configured")
 
-    print(f"Starting research for topic: {cleaned_topic}")
-
-    # Generate research plan
-    print("Generating research plan...")
-    research_plan = openrouter_client.generate_research_plan(cleaned_topic)
-    if not research_plan:
-        raise RuntimeError("Failed to generate research plan")
+    deadline = deadline or Deadline(RESEARCH_DEADLINE_SECONDS)
+    print(f"Starting research for topic: {cleaned_topic} ({deadline.remaining():.0f}s budget)")
 
-    print(f"Research plan generated: {research_plan[:100]}...")
+    # Generate research plan, only when search and report still fit afterwards
+    plan_budget = deadline.budget(PLAN_TIMEOUT, reserve=(SEARCH_TIMEOUT + REPORT_TIMEOUT) / 2)
+    if plan_budget >= PLAN_MIN_SECONDS:
+        print("Generating research plan...")
+        try:
+            research_plan = openrouter_client.generate_research_plan(cleaned_topic, timeout=plan_budget)
+        except Exception as exc:
+            # The plan is optional: a timeout or upstream error (e.g. 429) only skips it
+            research_plan = ""
+            print(f"Research plan failed, continuing without it: {str(exc)}")
+        if research_plan:
+            print(f"Research plan generated: {research_plan[:100]}...")
+    else:
+        print(f"Skipping research plan ({deadline.remaining():.0f}s left)")
 
     # Conduct research using Tavily
-    print("Conducting research with Tavily...")
-    research_data = tavily_client.search(cleaned_topic, max_results=5)
+    search_budget = deadline.budget(SEARCH_TIMEOUT, reserve=REPORT_MIN_SECONDS)
+    if search_budget < SEARCH_MIN_SECONDS:
+        # Too short for search plus a report: spend it all on sources for a partial result
+        search_budget = deadline.budget(SEARCH_TIMEOUT)
+    if search_budget >= SEARCH_MIN_SECONDS:
+        max_results = 5 if search_budget >= SEARCH_TIMEOUT / 2 else 2
+        print(f"Conducting research with Tavily ({max_results} results)...")
+        try:
+            research_data = tavily_client.search(cleaned_topic, max_results=max_results, timeout=search_budget)
+        except httpx.TimeoutException:
+            raise DeadlineExceeded("Research deadline exceeded while searching")
+    else:
+        raise DeadlineExceeded("Research deadline exceeded before searching")
+
     if not research_data:
         raise RuntimeError("Failed to gather research data")
 
     print(f"Research data gathered: {len(research_data)} characters")
+    if progress is not None:
+        progress["research_data"] = research_data
+
+    # Generate final report, shortened to fit whatever time is left
+    report_budget = deadline.budget(REPORT_TIMEOUT)
+    if report_budget < REPORT_MIN_SECONDS:
+        print(f"No time left for the report ({report_budget:.0f}s), returning partial results")
+        return ResearchResult(report=build_partial_report(cleaned_topic, research_data), partial=True)
+
+    max_tokens = next(tokens for seconds, tokens in REPORT_TOKEN_BUDGETS if report_budget >= seconds)
+    print(f"Generating final report ({max_tokens} max tokens)...")
+    try:
+        report = openrouter_client.generate_report(
+            cleaned_topic, research_data, timeout=report_budget, max_tokens=max_tokens
+        )
+    except httpx.TimeoutException:
+        print("Report generation timed out, returning partial results")
+        return ResearchResult(report=build_partial_report(cleaned_topic, research_data), partial=True)
 
-    # Generate final report
-    print("Generating final report...")
-    report = openrouter_client.generate_report(cleaned_topic, research_data)
     if not report:
         raise RuntimeError("Failed to generate report")
 
     print("Research completed successfully")
-    return report
+    return ResearchResult(report=report)
+
+def normalize_topic(topic: str) -> str:
+    return " ".join((topic or "").lower().split())
+
+
+class TopicTracker:
+    """Counts /api/research topics so the prefetcher knows what is popular.
+
+    Once more than ``max_topics`` distinct topics are tracked, only the
+    ``keep_topics`` most frequent survive, so free-text traffic cannot
+    grow it without bound.
+    """
+
+    def __init__(self, max_topics: int, keep_topics: int):
+        self.max_topics = max_topics
+        self.keep_topics = keep_topics
+        self._counts: Counter = Counter()
+        self._labels: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, topic: str) -> None:
+        key = normalize_topic(topic)
+        if not key:
+            return
+        with self._lock:
+            self._counts[key] += 1
+            self._labels[key] = topic.strip()
+            if len(self._counts) > self.max_topics:
+                self._prune()
+
+    def _prune(self) -> None:
+        kept = dict(self._counts.most_common(self.keep_topics))
+        self._counts = Counter(kept)
+        self._labels = {key: self._labels[key] for key in kept}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._counts)
+
+    def top(self, n: int, min_count: int = 1) -> List[str]:
+        with self._lock:
+            return [
+                self._labels[key]
+                for key, count in self._counts.most_common(n)
+                if count >= min_count
+            ]
+
+    def decay(self) -> None:
+        """Halve every count so yesterday's trends fade out."""
+        with self._lock:
+            for key in list(self._counts):
+                self._counts[key] //= 2
+                if not self._counts[key]:
+                    del self._counts[key]
+                    del self._labels[key]
+
+
+class WarmResult(BaseModel):
+    topic: str
+    report: str
+    report_id: str
+    created_at: float
+
+
+class WarmResultCache:
+    """Pre-computed research results keyed by normalized topic.
+
+    Expired entries are dropped on every ``put`` and at most
+    ``max_entries`` are kept, oldest first out.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[str, WarmResult] = {}
+        self._lock = threading.Lock()
+
+    def get(self, topic: str) -> Optional[WarmResult]:
+        key = normalize_topic(topic)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry.created_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            return entry
+
+    def put(self, document: ReportDocument, report: str) -> None:
+        entry = WarmResult(
+            topic=document.topic,
+            report=report,
+            report_id=document.report_id,
+            created_at=time.time(),
+        )
+        with self._lock:
+            self._entries[normalize_topic(document.topic)] = entry
+            expired = [
+                key for key, cached in self._entries.items()
+                if entry.created_at - cached.created_at > self.ttl_seconds
+            ]
+            for key in expired:
+                del self._entries[key]
+            if len(self._entries) > self.max_entries:
+                newest = sorted(self._entries.items(), key=lambda item: item[1].created_at, reverse=True)
+                self._entries = dict(newest[:self.max_entries])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+def parse_hour_window(window: str) -> Tuple[int, int]:
+    start, end = (int(part) for part in window.split("-", 1))
+    if not (0 <= start < 24 and 0 <= end <= 24):
+        raise ValueError(f"Invalid hour window: {window}")
+    return start, end
+
+
+class PrefetchScheduler:
+    """Pre-computes reports and PDFs for trending topics during off-peak hours."""
+
+    def __init__(self, tracker: TopicTracker, results: WarmResultCache):
+        self.tracker = tracker
+        self.results = results
+        self.offpeak_start, self.offpeak_end = parse_hour_window(PREFETCH_OFFPEAK_HOURS)
+        self.runs_today = 0
+        self.budget_day = datetime.date.today()
+        self.task: Optional[asyncio.Task] = None
+
+    def is_offpeak(self, now: datetime.datetime) -> bool:
+        if self.offpeak_start <= self.offpeak_end:
+            return self.offpeak_start <= now.hour < self.offpeak_end
+        return now.hour >= self.offpeak_start or now.hour < self.offpeak_end
+
+    def roll_budget(self, today: datetime.date) -> None:
+        if today != self.budget_day:
+            self.budget_day = today
+            self.runs_today = 0
+            self.tracker.decay()
+
+    async def warm_topic(self, topic: str) -> None:
+        async with research_semaphore:
+            result = await asyncio.to_thread(perform_research, topic, Deadline(RESEARCH_DEADLINE_SECONDS))
+        if result.partial:
+            return
+
+        document = await asyncio.to_thread(get_report_document, topic, result.report)
+        await asyncio.to_thread(render_report, document, "web")
+        pdf_stream = await render_pdf_stream(document)
+        pdf_stream.close()
+        self.results.put(document, result.report)
+
+    async def run_once(self) -> int:
+        """Warm as many trending topics as the window and budget allow."""
+        now = datetime.datetime.now()
+        self.roll_budget(now.date())
+        if not self.is_offpeak(now):
+            return 0
+
+        warmed = 0
+        for topic in self.tracker.top(PREFETCH_TOP_N, PREFETCH_MIN_REQUESTS):
+            if self.runs_today >= PREFETCH_DAILY_RUNS:
+                break
+            if self.results.get(topic) is not None:
+                continue
+
+            # Each run spends upstream calls whether or not it succeeds
+            self.runs_today += 1
+            try:
+                await self.warm_topic(topic)
+                warmed += 1
+            except Exception as exc:
+                print(f"Prefetch failed for {topic}: {str(exc)}")
+
+        if warmed:
+            print(f"Prefetched {warmed} topics ({self.runs_today}/{PREFETCH_DAILY_RUNS} runs today)")
+        return warmed
+
+    async def run_forever(self) -> None:
+        while True:
+            await asyncio.sleep(PREFETCH_INTERVAL_SECONDS)
+            try:
+                await self.run_once()
+            except Exception as exc:
+                print(f"Prefetch error: {str(exc)}")
+                traceback.print_exc()
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self) -> None:
+        if self.task is None:
+            self.task = asyncio.create_task(self.run_forever())
+
+    async def stop(self) -> None:
+        if self.task is None:
+            return
+        self.task.cancel()
+        try:
+            await self.task
+        except asyncio.CancelledError:
+            pass
+        self.task = None
+
+
+topic_tracker = TopicTracker(max_topics=PREFETCH_TOP_N * 50, keep_topics=PREFETCH_TOP_N * 5)
+warm_results = WarmResultCache(PREFETCH_TTL_SECONDS, max_entries=PREFETCH_TOP_N)
+prefetch_scheduler = PrefetchScheduler(topic_tracker, warm_results)
+
 
 @app.get("/")
 async def serve_frontend():
     """Serve the main HTML page"""
     return FileResponse("frontend/index.html")
 
+def release_research_slot(worker: "asyncio.Future") -> None:
+    research_semaphore.release()
+    # Mark failures of abandoned workers as retrieved; the handler already responded
+    if not worker.cancelled():
+        worker.exception()
+
+
 @app.post("/api/research", response_model=ResearchResponse)
 async def conduct_research(request: ResearchRequest):
     """Conduct research on a given topic"""
+    # Topic counts only feed the prefetcher; don't accumulate them when it is off
+    if prefetch_scheduler.running:
+        topic_tracker.record(request.topic)
+
+    warm = warm_results.get(request.topic)
+    if warm is not None:
+        # Reuse the warmed document so its cached web HTML and PDF are hit,
+        # whatever casing or spacing this request used for the topic
+        document = report_cache.get_document(warm.report_id)
+        if document is None:
+            document = await asyncio.to_thread(get_report_document, warm.topic, warm.report)
+        web_html = await asyncio.to_thread(render_report, document, "web")
+        return ResearchResponse(
+            report=warm.report,
+            status="success",
+            session_id="",
+            queue_position=0,
+            report_id=document.report_id,
+            html=web_html.decode("utf-8")
+        )
+
+    seconds = RESEARCH_DEADLINE_SECONDS
+    if request.deadline_seconds and request.deadline_seconds > 0:
+        seconds = min(request.deadline_seconds, RESEARCH_DEADLINE_SECONDS)
+    deadline = Deadline(seconds)
+
     try:
-        async with research_semaphore:
-            report = await asyncio.to_thread(perform_research, request.topic)
+        # Time spent waiting for a slot counts against the deadline too
+        await asyncio.wait_for(research_semaphore.acquire(), timeout=deadline.remaining())
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Research deadline exceeded while waiting in queue")
+
+    try:
+        progress: Dict[str, str] = {}
+        worker = asyncio.ensure_future(asyncio.to_thread(perform_research, request.topic, deadline, progress))
+        # The thread cannot be interrupted, so its slot is only freed once it really finishes
+        worker.add_done_callback(release_research_slot)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(worker), timeout=deadline.remaining())
+        except asyncio.TimeoutError:
+            if not progress.get("research_data"):
+                raise DeadlineExceeded("Research deadline exceeded")
+            print("Research deadline reached, returning partial results")
+            result = ResearchResult(
+                report=build_partial_report(request.topic.strip(), progress["research_data"]),
+                partial=True,
+            )
+
+        document = await asyncio.to_thread(get_report_document, request.topic, result.report)
+        web_html = await asyncio.to_thread(render_report, document, "web")
 
         return ResearchResponse(
-            report=report,
-            status="success",
+            report=result.report,
+            status="partial" if result.partial else "success",
             session_id="",
-            queue_position=0
+            queue_position=0,
+            report_id=document.report_id,
+            html=web_html.decode("utf-8"),
+            partial=result.partial
         )
 
     except ValueError as e:
         raise HTTPException(status_code=500, detail=str(e))
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
@@ -421,7 +1188,8 @@ def build_pdf_filename(topic: str) -> str:
 async def download_pdf(request: PDFRequest):
     """Generate a PDF version of the research report."""
     try:
-        buffer = await asyncio.to_thread(generate_pdf_bytes, request.topic, request.report)
+        document = await asyncio.to_thread(get_report_document, request.topic, request.report)
+        stream = await render_pdf_stream(document)
     except ValueError as exc:
         raise HTTPException(status_code=400, detail=str(exc))
     except Exception as exc:
@@ -431,7 +1199,40 @@ async def download_pdf(request: PDFRequest):
 
     filename = f"{build_pdf_filename(request.topic)}.pdf"
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
-    return StreamingResponse(buffer, media_type="application/pdf", headers=headers)
+    return StreamingResponse(iter_file_chunks(stream), media_type="application/pdf", headers=headers)
+
+
+@app.post("/api/export/{fmt}")
+async def export_report(fmt: str, request: ExportRequest):
+    """Export a report as PDF, HTML, Markdown or DOCX from its parsed tree."""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported export format: {fmt}")
+
+    document = report_cache.get_document(request.report_id) if request.report_id else None
+    try:
+        if document is None:
+            if not request.report:
+                raise HTTPException(status_code=404, detail="Report not found; include the report text")
+            document = await asyncio.to_thread(get_report_document, request.topic, request.report)
+        if fmt == "pdf":
+            stream = await render_pdf_stream(document)
+        else:
+            content = await asyncio.to_thread(render_report, document, fmt)
+    except HTTPException:
+        raise
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except Exception as exc:
+        print(f"Export error ({fmt}): {str(exc)}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to export {fmt} report")
+
+    media_type, extension = EXPORT_FORMATS[fmt]
+    filename = f"{build_pdf_filename(document.topic)}.{extension}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if fmt == "pdf":
+        return StreamingResponse(iter_file_chunks(stream), media_type=media_type, headers=headers)
+    return Response(content=content, media_type=media_type, headers=headers)
 
 
 if __name__ == "__main__":